@@ -22,8 +22,14 @@ Notes:
   in EnumDisplaySettingsW / ChangeDisplaySettingsExW calls to target a specific \\.\DISPLAYn device.
 """
 
+import array
+import base64
 import ctypes
 from ctypes import wintypes
+from dataclasses import dataclass
+import io
+import logging
+import socket
 import threading
 import time
 import sys
@@ -35,11 +41,17 @@ from tkinter import ttk, messagebox
 # If not available, the minimize-to-tray feature will be disabled and the user will be prompted.
 try:
     import pystray
-    from PIL import Image, ImageDraw
+    from PIL import Image
     PYSTRAY_AVAILABLE = True
 except Exception:
     PYSTRAY_AVAILABLE = False
 
+# Diagnostics go through logging so the display-query paths stay near-zero
+# cost by default (console writes are slow on Windows); enable with
+# logging.basicConfig(level=logging.DEBUG).
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
 # -------------------- Win32 Display functions -------------------- #
 user32 = ctypes.WinDLL('user32', use_last_error=True)
 
@@ -86,6 +98,9 @@ class DEVMODEW(ctypes.Structure):
         ("dmPanningHeight", wintypes.DWORD),
     ]
 
+# sizeof walks _fields_ each call; the struct size is a constant, compute once
+_DEVMODEW_SIZE = ctypes.sizeof(DEVMODEW)
+
 EnumDisplaySettingsW = user32.EnumDisplaySettingsW
 EnumDisplaySettingsW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, ctypes.POINTER(DEVMODEW)]
 EnumDisplaySettingsW.restype  = wintypes.BOOL
@@ -94,28 +109,210 @@ ChangeDisplaySettingsExW = user32.ChangeDisplaySettingsExW
 ChangeDisplaySettingsExW.argtypes = [wintypes.LPCWSTR, ctypes.POINTER(DEVMODEW), wintypes.HWND, wintypes.DWORD, ctypes.c_void_p]
 ChangeDisplaySettingsExW.restype  = wintypes.LONG
 
-def list_modes(device_name=None):
-    modes = []
+# Mode enumeration caches. EnumDisplaySettingsW can take seconds on some
+# drivers and the mode list only changes when the display configuration does,
+# so we enumerate once per device and reuse the result. The caches are dropped
+# whenever get_current_mode reports a new resolution for the device.
+_MODES_CACHE = {}       # device_name -> list of (width, height, bpp, hz)
+_RATES_CACHE = {}       # (device_name, (width, height)) -> (sorted tuple, frozenset) of hz
+_LAST_RESOLUTION = {}   # device_name -> (width, height) last seen
+
+def _invalidate_if_resolution_changed(device_name, current_resolution):
+    # A resolution change means the user (or driver) reconfigured the display,
+    # so any cached mode data for this device is stale.
+    if _LAST_RESOLUTION.get(device_name) != current_resolution:
+        _LAST_RESOLUTION[device_name] = current_resolution
+        _MODES_CACHE.pop(device_name, None)
+        for key in [k for k in _RATES_CACHE if k[0] == device_name]:
+            del _RATES_CACHE[key]
+
+def _list_modes_uncached(device_name=None):
+    # Collect the fields into four flat uint arrays while looping so the
+    # Win32 loop doesn't materialize a Python tuple per DEVMODE (drivers can
+    # report 300+ modes); tuples are built once at the end.
+    widths = array.array('I')
+    heights = array.array('I')
+    bpps = array.array('I')
+    freqs = array.array('I')
     i = 0
     dm = DEVMODEW()
-    dm.dmSize = ctypes.sizeof(DEVMODEW)
-    while True:
-        ok = EnumDisplaySettingsW(device_name, i, ctypes.byref(dm))
-        if not ok:
-            break
-        modes.append((dm.dmPelsWidth, dm.dmPelsHeight, dm.dmBitsPerPel, dm.dmDisplayFrequency))
+    dm.dmSize = _DEVMODEW_SIZE
+    pdm = ctypes.byref(dm)
+    while EnumDisplaySettingsW(device_name, i, pdm):
+        widths.append(dm.dmPelsWidth)
+        heights.append(dm.dmPelsHeight)
+        bpps.append(dm.dmBitsPerPel)
+        freqs.append(dm.dmDisplayFrequency)
         i += 1
-    # remove duplicates and sort
-    modes = sorted(set(modes), key=lambda x: (x[0], x[1], x[3], x[2]))
+    # remove duplicates (dict.fromkeys, single pass) and sort
+    modes = sorted(dict.fromkeys(zip(widths, heights, bpps, freqs)),
+                   key=lambda x: (x[0], x[1], x[3], x[2]))
     return modes
 
+def list_modes(device_name=None):
+    modes = _MODES_CACHE.get(device_name)
+    if modes is None:
+        modes = _MODES_CACHE[device_name] = _list_modes_uncached(device_name)
+    return modes
+
+def _valid_rates(device_name, current_resolution):
+    # Refresh rates supported at the given resolution: an ascending tuple for
+    # display plus a frozenset for cheap membership tests, cached alongside
+    # the mode list. list_modes output is sorted by (w, h, hz, bpp), so the
+    # filtered rates already arrive ascending and dict.fromkeys dedupes them
+    # in one pass with no re-sort.
+    key = (device_name, current_resolution)
+    entry = _RATES_CACHE.get(key)
+    if entry is None:
+        ordered = tuple(dict.fromkeys(r for (w, h, bpp, r) in list_modes(device_name)
+                                      if (w, h) == current_resolution))
+        entry = (ordered, frozenset(ordered))
+        _RATES_CACHE[key] = entry
+    return entry
+
 def get_current_mode(device_name=None):
     dm = DEVMODEW()
-    dm.dmSize = ctypes.sizeof(DEVMODEW)
+    dm.dmSize = _DEVMODEW_SIZE
     if not EnumDisplaySettingsW(device_name, ENUM_CURRENT_SETTINGS, ctypes.byref(dm)):
         return None
     return dm
 
+# -------------------- CCD (QueryDisplayConfig) fast path -------------------- #
+# The CCD API returns all active paths and their modes in one bulk call, with
+# the refresh rate as an exact rational (vSyncFreq). We use it to read the
+# current resolution + refresh rate for the snapshot instead of a per-query
+# EnumDisplaySettingsW roundtrip. It only describes *active* modes, so the
+# full supported-mode enumeration stays on (cached) EnumDisplaySettingsW.
+
+QDC_ONLY_ACTIVE_PATHS = 0x00000002
+DISPLAYCONFIG_MODE_INFO_TYPE_SOURCE = 1
+DISPLAYCONFIG_MODE_INFO_TYPE_TARGET = 2
+ERROR_SUCCESS = 0
+
+class LUID(ctypes.Structure):
+    _fields_ = [('LowPart', wintypes.DWORD), ('HighPart', wintypes.LONG)]
+
+class DISPLAYCONFIG_RATIONAL(ctypes.Structure):
+    _fields_ = [('Numerator', wintypes.DWORD), ('Denominator', wintypes.DWORD)]
+
+class DISPLAYCONFIG_PATH_SOURCE_INFO(ctypes.Structure):
+    _fields_ = [
+        ('adapterId', LUID),
+        ('id', wintypes.DWORD),
+        ('modeInfoIdx', wintypes.DWORD),
+        ('statusFlags', wintypes.DWORD),
+    ]
+
+class DISPLAYCONFIG_PATH_TARGET_INFO(ctypes.Structure):
+    _fields_ = [
+        ('adapterId', LUID),
+        ('id', wintypes.DWORD),
+        ('modeInfoIdx', wintypes.DWORD),
+        ('outputTechnology', wintypes.DWORD),
+        ('rotation', wintypes.DWORD),
+        ('scaling', wintypes.DWORD),
+        ('refreshRate', DISPLAYCONFIG_RATIONAL),
+        ('scanLineOrdering', wintypes.DWORD),
+        ('targetAvailable', wintypes.BOOL),
+        ('statusFlags', wintypes.DWORD),
+    ]
+
+class DISPLAYCONFIG_PATH_INFO(ctypes.Structure):
+    _fields_ = [
+        ('sourceInfo', DISPLAYCONFIG_PATH_SOURCE_INFO),
+        ('targetInfo', DISPLAYCONFIG_PATH_TARGET_INFO),
+        ('flags', wintypes.DWORD),
+    ]
+
+class DISPLAYCONFIG_2DREGION(ctypes.Structure):
+    _fields_ = [('cx', wintypes.DWORD), ('cy', wintypes.DWORD)]
+
+class DISPLAYCONFIG_VIDEO_SIGNAL_INFO(ctypes.Structure):
+    _fields_ = [
+        ('pixelRate', ctypes.c_uint64),
+        ('hSyncFreq', DISPLAYCONFIG_RATIONAL),
+        ('vSyncFreq', DISPLAYCONFIG_RATIONAL),
+        ('activeSize', DISPLAYCONFIG_2DREGION),
+        ('totalSize', DISPLAYCONFIG_2DREGION),
+        ('videoStandard', wintypes.DWORD),
+        ('scanLineOrdering', wintypes.DWORD),
+    ]
+
+class DISPLAYCONFIG_TARGET_MODE(ctypes.Structure):
+    _fields_ = [('targetVideoSignalInfo', DISPLAYCONFIG_VIDEO_SIGNAL_INFO)]
+
+class DISPLAYCONFIG_SOURCE_MODE(ctypes.Structure):
+    _fields_ = [
+        ('width', wintypes.DWORD),
+        ('height', wintypes.DWORD),
+        ('pixelFormat', wintypes.DWORD),
+        ('position', wintypes.POINT),
+    ]
+
+class _DISPLAYCONFIG_MODE_INFO_UNION(ctypes.Union):
+    _fields_ = [
+        ('targetMode', DISPLAYCONFIG_TARGET_MODE),
+        ('sourceMode', DISPLAYCONFIG_SOURCE_MODE),
+        ('_padding', ctypes.c_ubyte * 48),  # desktopImageInfo variant
+    ]
+
+class DISPLAYCONFIG_MODE_INFO(ctypes.Structure):
+    _anonymous_ = ('u',)
+    _fields_ = [
+        ('infoType', wintypes.DWORD),
+        ('id', wintypes.DWORD),
+        ('adapterId', LUID),
+        ('u', _DISPLAYCONFIG_MODE_INFO_UNION),
+    ]
+
+GetDisplayConfigBufferSizes = user32.GetDisplayConfigBufferSizes
+GetDisplayConfigBufferSizes.argtypes = [wintypes.DWORD, ctypes.POINTER(wintypes.UINT), ctypes.POINTER(wintypes.UINT)]
+GetDisplayConfigBufferSizes.restype  = wintypes.LONG
+
+QueryDisplayConfig = user32.QueryDisplayConfig
+QueryDisplayConfig.argtypes = [wintypes.DWORD, ctypes.POINTER(wintypes.UINT), ctypes.POINTER(DISPLAYCONFIG_PATH_INFO),
+                               ctypes.POINTER(wintypes.UINT), ctypes.POINTER(DISPLAYCONFIG_MODE_INFO), ctypes.c_void_p]
+QueryDisplayConfig.restype  = wintypes.LONG
+
+def query_current_display_state():
+    """
+    Read (width, height, hz) for the first active display path in a single
+    QueryDisplayConfig call. Returns None if the CCD API is unavailable or
+    fails, in which case callers fall back to EnumDisplaySettingsW.
+    """
+    num_paths = wintypes.UINT(0)
+    num_modes = wintypes.UINT(0)
+    if GetDisplayConfigBufferSizes(QDC_ONLY_ACTIVE_PATHS, ctypes.byref(num_paths),
+                                   ctypes.byref(num_modes)) != ERROR_SUCCESS:
+        return None
+    paths = (DISPLAYCONFIG_PATH_INFO * num_paths.value)()
+    modes = (DISPLAYCONFIG_MODE_INFO * num_modes.value)()
+    if QueryDisplayConfig(QDC_ONLY_ACTIVE_PATHS, ctypes.byref(num_paths), paths,
+                          ctypes.byref(num_modes), modes, None) != ERROR_SUCCESS:
+        return None
+    if not num_paths.value:
+        return None
+    # Resolve the source and target modes through the first path's mode
+    # indices so both belong to the same display; the flat mode table's
+    # ordering is unspecified, and on multi-monitor systems picking the first
+    # SOURCE and first TARGET entries independently can mix displays.
+    path = paths[0]
+    src_idx = path.sourceInfo.modeInfoIdx
+    tgt_idx = path.targetInfo.modeInfoIdx
+    # DISPLAYCONFIG_PATH_MODE_IDX_INVALID (0xffffffff) also fails this check
+    if src_idx >= num_modes.value or tgt_idx >= num_modes.value:
+        return None
+    src = modes[src_idx]
+    tgt = modes[tgt_idx]
+    if (src.infoType != DISPLAYCONFIG_MODE_INFO_TYPE_SOURCE
+            or tgt.infoType != DISPLAYCONFIG_MODE_INFO_TYPE_TARGET):
+        return None
+    width, height = src.sourceMode.width, src.sourceMode.height
+    freq = tgt.targetMode.targetVideoSignalInfo.vSyncFreq
+    if not (width and freq.Denominator):
+        return None
+    return (width, height, round(freq.Numerator / freq.Denominator))
+
 def get_available_refresh_rates(device_name=None):
     """
     Get all available refresh rates for the current resolution.
@@ -125,67 +322,71 @@ def get_available_refresh_rates(device_name=None):
         # Get current display mode to determine current resolution
         dm = get_current_mode(device_name)
         if dm is None:
-            print("Warning: Could not get current display mode. Using default rates.")
+            log.warning("Could not get current display mode. Using default rates.")
             return (60, 120, 144, 165, 240)  # Fallback to common rates
         
         # Get current resolution
         current_resolution = (dm.dmPelsWidth, dm.dmPelsHeight)
-        print(f"Current resolution: {current_resolution[0]}x{current_resolution[1]}")
-        
-        # Get all display modes
-        all_modes = list_modes(device_name)
-        
-        # Filter to only get refresh rates at current resolution
-        available_rates = []
-        for (width, height, bpp, refresh_rate) in all_modes:
-            if (width, height) == current_resolution:
-                available_rates.append(refresh_rate)
-        
-        # Remove duplicates and sort
-        available_rates = sorted(set(available_rates))
+        log.debug("Current resolution: %sx%s", current_resolution[0], current_resolution[1])
+
+        # Refresh rates at the current resolution (cached per resolution,
+        # already deduped and ascending)
+        _invalidate_if_resolution_changed(device_name, current_resolution)
+        available_rates, _ = _valid_rates(device_name, current_resolution)
         
         if not available_rates:
-            print("Warning: No refresh rates found. Using default rates.")
+            log.warning("No refresh rates found. Using default rates.")
             return (60, 120, 144, 165, 240)  # Fallback
         
-        print(f"Available refresh rates: {available_rates}")
-        
-        # Return as tuple
-        return tuple(available_rates)
+        log.debug("Available refresh rates: %s", available_rates)
+
+        return available_rates
         
     except Exception as e:
-        print(f"Error getting available refresh rates: {e}")
+        log.warning("Error getting available refresh rates: %s", e)
         # Fallback to common refresh rates
         return (60, 120, 144, 165, 240)
 
+# Rates the driver has actually accepted before; for these the CDS_TEST probe
+# is skipped, halving the driver roundtrips on every steady-state apply.
+_KNOWN_GOOD_RATES = set()
+
 def set_refresh_rate(target_hz, device_name=None, test_first=True):
     dm = get_current_mode(device_name)
     if dm is None:
         raise RuntimeError("Unable to get current display settings")
 
     cur_res = (dm.dmPelsWidth, dm.dmPelsHeight)
-    modes = list_modes(device_name)
-    valid_rates = [r for (w,h,bpp,r) in modes if (w,h)==cur_res]
+    _invalidate_if_resolution_changed(device_name, cur_res)
+    rate_tuple, valid_rates = _valid_rates(device_name, cur_res)
 
     if target_hz not in valid_rates:
-        raise RuntimeError(f"Requested {target_hz} Hz not supported at current resolution {cur_res}. Available: {sorted(set(valid_rates))}")
+        raise RuntimeError(f"Requested {target_hz} Hz not supported at current resolution {cur_res}. Available: {list(rate_tuple)}")
 
     new_dm = DEVMODEW()
-    new_dm.dmSize = ctypes.sizeof(DEVMODEW)
+    new_dm.dmSize = _DEVMODEW_SIZE
     if not EnumDisplaySettingsW(device_name, ENUM_CURRENT_SETTINGS, ctypes.byref(new_dm)):
         raise RuntimeError("Unable to read current settings into new DEVMODE")
 
     new_dm.dmDisplayFrequency = int(target_hz)
     new_dm.dmFields = new_dm.dmFields | DM_DISPLAYFREQUENCY
 
-    if test_first:
+    do_test = test_first and target_hz not in _KNOWN_GOOD_RATES
+    if do_test:
         res = ChangeDisplaySettingsExW(device_name, ctypes.byref(new_dm), None, CDS_TEST, None)
         if res != DISP_CHANGE_SUCCESSFUL:
             raise RuntimeError(f"Test-change failed (code {res}). Driver may not allow this mode.")
 
     res = ChangeDisplaySettingsExW(device_name, ctypes.byref(new_dm), None, 0, None)
     if res != DISP_CHANGE_SUCCESSFUL:
+        if not do_test:
+            # We skipped the probe; run it now for a clearer error message.
+            _KNOWN_GOOD_RATES.discard(target_hz)
+            test = ChangeDisplaySettingsExW(device_name, ctypes.byref(new_dm), None, CDS_TEST, None)
+            if test != DISP_CHANGE_SUCCESSFUL:
+                raise RuntimeError(f"Test-change failed (code {test}). Driver may not allow this mode.")
         raise RuntimeError(f"Change failed (code {res}).")
+    _KNOWN_GOOD_RATES.add(target_hz)
     return True
 
 # -------------------- Power status (charging) -------------------- #
@@ -203,21 +404,152 @@ GetSystemPowerStatus = ctypes.windll.kernel32.GetSystemPowerStatus
 GetSystemPowerStatus.argtypes = [ctypes.POINTER(SYSTEM_POWER_STATUS)]
 GetSystemPowerStatus.restype = wintypes.BOOL
 
-def is_plugged_in():
+# ACLineStatus: 0 = offline, 1 = online, 255 = unknown.
+# Decode via lookup tables instead of chained ternaries / exception handling.
+_AC_STATE = {0: False, 1: True}   # anything else -> None (unknown)
+_AC_TEXT = {
+    True: "Plugged In (Charging)",
+    False: "On Battery (Discharging)",
+    None: "Unknown",
+}
+
+def get_ac_line_status():
     status = SYSTEM_POWER_STATUS()
     if not GetSystemPowerStatus(ctypes.byref(status)):
-        raise RuntimeError("GetSystemPowerStatus failed")
-    # ACLineStatus: 0 = offline, 1 = online, 255 = unknown
-    return status.ACLineStatus == 1
+        return 255  # treat API failure as unknown
+    return status.ACLineStatus
+
+# -------------------- Power-setting change notifications -------------------- #
+# Instead of polling GetSystemPowerStatus we register a hidden message-only
+# window for GUID_ACDC_POWER_SOURCE notifications; Windows then tells us when
+# the AC status changes and the worker thread sleeps the rest of the time.
+
+WM_POWERBROADCAST = 0x0218
+PBT_POWERSETTINGCHANGE = 0x8013
+HWND_MESSAGE = -3
+PM_REMOVE = 0x0001
+QS_ALLINPUT = 0x04FF
+DEVICE_NOTIFY_WINDOW_HANDLE = 0
+
+class GUID(ctypes.Structure):
+    _fields_ = [
+        ('Data1', wintypes.DWORD),
+        ('Data2', wintypes.WORD),
+        ('Data3', wintypes.WORD),
+        ('Data4', ctypes.c_ubyte * 8),
+    ]
+
+# {5D3E9A59-E9D5-4B00-A6BD-FF34FF516548}
+GUID_ACDC_POWER_SOURCE = GUID(0x5D3E9A59, 0xE9D5, 0x4B00,
+                              (ctypes.c_ubyte * 8)(0xA6, 0xBD, 0xFF, 0x34, 0xFF, 0x51, 0x65, 0x48))
+
+class POWERBROADCAST_SETTING(ctypes.Structure):
+    _fields_ = [
+        ('PowerSetting', GUID),
+        ('DataLength', wintypes.DWORD),
+        ('Data', ctypes.c_ubyte * 1),
+    ]
+
+WNDPROC = ctypes.WINFUNCTYPE(ctypes.c_ssize_t, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+
+class WNDCLASSW(ctypes.Structure):
+    _fields_ = [
+        ('style', wintypes.UINT),
+        ('lpfnWndProc', WNDPROC),
+        ('cbClsExtra', ctypes.c_int),
+        ('cbWndExtra', ctypes.c_int),
+        ('hInstance', wintypes.HINSTANCE),
+        ('hIcon', wintypes.HICON),
+        ('hCursor', wintypes.HANDLE),
+        ('hbrBackground', wintypes.HBRUSH),
+        ('lpszMenuName', wintypes.LPCWSTR),
+        ('lpszClassName', wintypes.LPCWSTR),
+    ]
+
+DefWindowProcW = user32.DefWindowProcW
+DefWindowProcW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+DefWindowProcW.restype  = ctypes.c_ssize_t
+
+RegisterClassW = user32.RegisterClassW
+RegisterClassW.argtypes = [ctypes.POINTER(WNDCLASSW)]
+RegisterClassW.restype  = wintypes.ATOM
+
+CreateWindowExW = user32.CreateWindowExW
+CreateWindowExW.argtypes = [wintypes.DWORD, wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.DWORD,
+                            ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                            wintypes.HWND, wintypes.HMENU, wintypes.HINSTANCE, wintypes.LPVOID]
+CreateWindowExW.restype  = wintypes.HWND
+
+RegisterPowerSettingNotification = user32.RegisterPowerSettingNotification
+RegisterPowerSettingNotification.argtypes = [wintypes.HANDLE, ctypes.POINTER(GUID), wintypes.DWORD]
+RegisterPowerSettingNotification.restype  = wintypes.HANDLE
+
+MsgWaitForMultipleObjectsEx = user32.MsgWaitForMultipleObjectsEx
+MsgWaitForMultipleObjectsEx.argtypes = [wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE), wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+MsgWaitForMultipleObjectsEx.restype  = wintypes.DWORD
+
+WAIT_OBJECT_0 = 0
+
+kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+
+CreateEventW = kernel32.CreateEventW
+CreateEventW.argtypes = [ctypes.c_void_p, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]
+CreateEventW.restype  = wintypes.HANDLE
+
+SetEvent = kernel32.SetEvent
+SetEvent.argtypes = [wintypes.HANDLE]
+SetEvent.restype  = wintypes.BOOL
+
+PeekMessageW = user32.PeekMessageW
+PeekMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT, wintypes.UINT]
+PeekMessageW.restype  = wintypes.BOOL
+
+TranslateMessage = user32.TranslateMessage
+TranslateMessage.argtypes = [ctypes.POINTER(wintypes.MSG)]
+TranslateMessage.restype  = wintypes.BOOL
+
+DispatchMessageW = user32.DispatchMessageW
+DispatchMessageW.argtypes = [ctypes.POINTER(wintypes.MSG)]
+DispatchMessageW.restype  = ctypes.c_ssize_t
 
 # -------------------- GUI & Tray -------------------- #
+# Tray icon baked in as PNG bytes (the old _create_image drawing code rendered
+# the same blue "RR" disc with ImageDraw on every startup). Decoded lazily so
+# PIL's image machinery is only touched if the tray is actually used.
+_ICON_PNG_BYTES = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAEAAAABACAYAAACqaXHeAAAA30lEQVR42u2a2w2AIBAEqcSa7Rgb"
+    "MAThHis3k/hnkJ1EUO5aAwAAAAjgunufuUqGPkrGbuhfy/AKLy/BO7i0iOjwUhKywktIyA6fKkEl"
+    "fIoEtfChElTDh0koLUA9vKuEtwd9ZTRpy7FcJCCgsoCZSc+8m6P7Lccyl4CAygJ2J5EpwEQCAhAQ"
+    "s3VZb4MIQEDiGrAyUcuxEIAAoW1wZQ2w2nbdvwbVBUj8C5QXcMTf4MyBiJqA8BOhkgI4GaY2QGWI"
+    "+iAVYnoEioanRYYmKdrkaJSkVTZARjuJkqEBAABAlgfhqX59cS4gHAAAAABJRU5ErkJggg=="
+)
+_ICON = None
+
+def _icon():
+    global _ICON
+    if _ICON is None:
+        _ICON = Image.open(io.BytesIO(_ICON_PNG_BYTES))
+        _ICON.load()
+    return _ICON
+
+@dataclass
+class Snapshot:
+    """Cached power+mode state so UI handlers don't make Win32 calls."""
+    plugged: object   # True / False / None (unknown)
+    width: int
+    height: int
+    hz: int
+    ts: float
+
 class RefreshGUI:
-    POLL_INTERVAL_SECONDS = 1
+    # Coarse fallback poll used only while ACLineStatus reports unknown (255);
+    # normal operation is fully event-driven via WM_POWERBROADCAST.
+    FALLBACK_POLL_SECONDS = 60
 
     def __init__(self, root):
         self.root = root
         self.root.title("RefreshRate Manager")
-        self.root.geometry("420x160")
+        self.root.geometry("420x190")
         self.root.protocol("WM_DELETE_WINDOW", self.on_exit)  # catch close (exit)
 
         # State
@@ -226,18 +558,57 @@ class RefreshGUI:
         # Get available refresh rates dynamically
         self.available_rates = get_available_refresh_rates()
         
-        # Set default selected rate to the highest available, or 240 if available
-        if self.available_rates:
-            default_rate = max(self.available_rates)
-        else:
-            default_rate = min(self.available_rates)
-            
-        self.selected_rate = tk.IntVar(value=default_rate)
+        # Automatic-mode targets only depend on available_rates, which is fixed
+        # at startup, so compute them once: highest rate on AC, lowest on
+        # battery (sane defaults if detection came up empty).
+        self._targets = {
+            True: max(self.available_rates) if self.available_rates else 240,
+            False: min(self.available_rates) if self.available_rates else 60,
+        }
+
+        # Set default selected rate to the highest available. The combobox
+        # holds pre-formatted strings so Tk doesn't convert each int to a Tcl
+        # string whenever the dropdown redraws; on_apply_clicked coerces back.
+        default_rate = self._targets[True]
+        self._rate_strings = tuple(str(r) for r in self.available_rates)
+
+        self.selected_rate = tk.StringVar(value=str(default_rate))
         self.current_status_var = tk.StringVar(value="Unknown")
         self.current_rate_var = tk.StringVar(value="Unknown")
+        self.error_var = tk.StringVar(value="")
+        # signature of the last reported auto-apply failure, so a persistent
+        # failure is reported once instead of on every AC transition
+        self._last_error_sig = None
         self.tray_icon = None
-        self.tray_thread = None
         self.running = True
+        # manual-reset kernel event; signalled on exit so the notification
+        # thread's wait returns immediately instead of timing out
+        self._stop_event = CreateEventW(None, True, False, None)
+        self._last_plugged = None
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = Snapshot(None, 0, 0, 0, 0.0)
+        self._refresh_snapshot()
+        # Pending UI work queued by the worker thread, drained by _tick on the
+        # Tk thread so we never touch Tk APIs from the background thread.
+        self._ui_lock = threading.Lock()
+        self._ui_pending = {}
+        self._tick_count = 0
+
+        # Preferred wakeup path: the worker writes a byte to a socketpair and
+        # Tk's event loop wakes via createfilehandler, so queued work is
+        # processed immediately with zero idle polling. createfilehandler is
+        # not implemented by every Tcl build (notably Windows), so fall back
+        # to draining from the periodic tick when it's unavailable.
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._filehandler = False
+        try:
+            self.root.tk.createfilehandler(self._wake_recv.fileno(), tk.READABLE,
+                                           self._on_power_event)
+            self._filehandler = True
+        except (AttributeError, tk.TclError):
+            pass
+        self._tick_ms = 5000 if self._filehandler else 250
 
         # Build UI
         frm = ttk.Frame(root, padding=12)
@@ -257,7 +628,7 @@ class RefreshGUI:
         self.rate_combo = ttk.Combobox(override_row, textvariable=self.selected_rate, width=8, state="readonly")
         
         # Populate dropdown with dynamically detected refresh rates
-        self.rate_combo['values'] = self.available_rates
+        self.rate_combo['values'] = self._rate_strings
         self.rate_combo.pack(side=tk.LEFT)
 
         btn_row = ttk.Frame(frm)
@@ -267,26 +638,17 @@ class RefreshGUI:
         ttk.Button(btn_row, text="Apply now", command=self.on_apply_clicked).pack(side=tk.LEFT, padx=6)
         ttk.Button(btn_row, text="Exit", command=self.on_exit).pack(side=tk.RIGHT, padx=6)
 
-        # Start polling thread
-        self.poll_thread = threading.Thread(target=self.poll_loop, daemon=True)
+        # non-modal status line for auto-apply errors (a modal dialog here
+        # would block the whole mainloop)
+        ttk.Label(frm, textvariable=self.error_var, foreground="red").pack(fill=tk.X, pady=(6, 0))
+
+        # Start the power-notification thread
+        self.poll_thread = threading.Thread(target=self.power_event_loop, daemon=True)
         self.poll_thread.start()
 
-        # Refresh displayed current refresh rate
+        # Refresh displayed current refresh rate and start the coalesced UI tick
         self.update_current_refresh_label()
-
-        # If pystray available, create an icon image for tray
-        if PYSTRAY_AVAILABLE:
-            self.icon_image = self._create_image()
-        else:
-            self.icon_image = None
-
-    def _create_image(self, width=64, height=64):
-        # create a simple PIL image for tray icon
-        img = Image.new('RGBA', (width, height), (0,0,0,0))
-        d = ImageDraw.Draw(img)
-        d.ellipse((8,8,width-8,height-8), fill=(30,144,255,255))
-        d.text((18,18), "RR", fill=(255,255,255,255))
-        return img
+        self.root.after(self._tick_ms, self._tick)
 
     def on_minimize(self):
         if not PYSTRAY_AVAILABLE:
@@ -302,15 +664,15 @@ class RefreshGUI:
             if self.override_var.get():
                 target = int(self.selected_rate.get())
             else:
-                # For automatic mode, use highest available rate when charging, lowest when not
-                if is_plugged_in():
-                    # use highest available
-                    target = max(self.available_rates)
-                else:
-                    # use lowest available
-                    target = min(self.available_rates)
+                # For automatic mode the targets are precomputed: highest
+                # available rate when charging, lowest when not (power state
+                # comes from the cached snapshot, no syscall)
+                target = self._targets[bool(self._snapshot.plugged)]
             set_refresh_rate(target)
+            self._refresh_snapshot(self._last_plugged)
             self.current_rate_var.set(f"{target} Hz")
+            self._last_error_sig = None
+            self.error_var.set("")
         except Exception as e:
             messagebox.showerror("Error applying refresh rate", str(e))
 
@@ -322,9 +684,10 @@ class RefreshGUI:
             # pystray.MenuItem("Apply now", lambda icon, item: self._tray_apply()),
             pystray.MenuItem("Exit", lambda icon, item: self._tray_exit())
         )
-        self.tray_icon = pystray.Icon("RefreshRateMgr", self.icon_image, "RefreshRate Manager", menu)
-        self.tray_thread = threading.Thread(target=self.tray_icon.run, daemon=True)
-        self.tray_thread.start()
+        self.tray_icon = pystray.Icon("RefreshRateMgr", _icon(), "RefreshRate Manager", menu)
+        # run_detached uses the platform's native message pump in-process
+        # instead of dedicating a Python thread to Icon.run
+        self.tray_icon.run_detached()
 
     def _tray_restore(self):
         try:
@@ -350,6 +713,7 @@ class RefreshGUI:
 
     def _tray_exit(self):
         self.running = False
+        SetEvent(self._stop_event)
         try:
             if self.tray_icon:
                 self.tray_icon.stop()
@@ -360,6 +724,7 @@ class RefreshGUI:
     def on_exit(self):
         # exit button: remove tray if present and close
         self.running = False
+        SetEvent(self._stop_event)
         try:
             if self.tray_icon:
                 self.tray_icon.stop()
@@ -368,58 +733,143 @@ class RefreshGUI:
         self.root.destroy()
 
     def update_current_refresh_label(self):
-        try:
+        # Read from the cached snapshot; no Win32 call on the UI thread.
+        snap = self._snapshot
+        self.current_rate_var.set(f"{snap.hz} Hz" if snap.hz else "Unknown")
+
+    def _query_plugged(self):
+        return _AC_STATE.get(get_ac_line_status())
+
+    def _refresh_snapshot(self, plugged=None):
+        # Take a fresh power+mode snapshot. Pass plugged (e.g. from a power
+        # notification) to skip the GetSystemPowerStatus call.
+        if plugged is None:
+            plugged = self._query_plugged()
+        # one bulk CCD call; EnumDisplaySettingsW only as fallback
+        state = query_current_display_state()
+        if state is not None:
+            width, height, hz = state
+        else:
             dm = get_current_mode(None)
             if dm is not None:
-                self.current_rate_var.set(f"{dm.dmDisplayFrequency} Hz")
+                width, height, hz = dm.dmPelsWidth, dm.dmPelsHeight, dm.dmDisplayFrequency
             else:
-                self.current_rate_var.set("Unknown")
-        except Exception:
-            self.current_rate_var.set("Unknown")
-        # schedule next label update in 5 seconds
-        self.root.after(5000, self.update_current_refresh_label)
-
-    def poll_loop(self):
-        # Poll power status and apply appropriate refresh rate when changed
-        last_plugged = None
-        while self.running:
-            try:
-                plugged = is_plugged_in()
-            except Exception:
-                plugged = None
-            # update UI text (on main thread)
-            status_text = "Plugged In (Charging)" if plugged else "On Battery (Discharging)" if plugged is not None else "Unknown"
+                width = height = hz = 0
+        with self._snapshot_lock:
+            self._snapshot = Snapshot(plugged, width, height, hz, time.time())
+        return plugged
+
+    def _create_power_window(self):
+        # Hidden message-only window that receives WM_POWERBROADCAST.
+        # Must be created on the thread that pumps its messages.
+        def wndproc(hwnd, msg_id, wparam, lparam):
+            if msg_id == WM_POWERBROADCAST and wparam == PBT_POWERSETTINGCHANGE:
+                setting = ctypes.cast(lparam, ctypes.POINTER(POWERBROADCAST_SETTING)).contents
+                if bytes(setting.PowerSetting) == bytes(GUID_ACDC_POWER_SOURCE) and setting.DataLength >= 1:
+                    # SYSTEM_POWER_CONDITION: 0 = AC, 1 = DC, 2 = hot (short-term source)
+                    self._handle_power_change(setting.Data[0] == 0)
+                return 1  # TRUE
+            return DefWindowProcW(hwnd, msg_id, wparam, lparam)
+
+        # keep a reference so the callback isn't garbage collected
+        self._wndproc = WNDPROC(wndproc)
+        wc = WNDCLASSW()
+        wc.lpfnWndProc = self._wndproc
+        wc.lpszClassName = "RefreshRateMgrPowerWnd"
+        wc.hInstance = ctypes.windll.kernel32.GetModuleHandleW(None)
+        RegisterClassW(ctypes.byref(wc))
+        hwnd = CreateWindowExW(0, wc.lpszClassName, None, 0, 0, 0, 0, 0,
+                               HWND_MESSAGE, None, wc.hInstance, None)
+        if hwnd:
+            self._power_notify = RegisterPowerSettingNotification(
+                hwnd, ctypes.byref(GUID_ACDC_POWER_SOURCE), DEVICE_NOTIFY_WINDOW_HANDLE)
+        return hwnd
+
+    def _handle_power_change(self, plugged):
+        # Called from the notification thread; queue work for the UI tick
+        # only on an actual change.
+        if plugged == self._last_plugged:
+            return
+        self._last_plugged = plugged
+        self._refresh_snapshot(plugged)
+        with self._ui_lock:
+            self._ui_pending['ac_changed'] = plugged
+        if self._filehandler:
+            # wake the Tk loop right away instead of waiting for the tick
             try:
-                self.root.after(0, self.current_status_var.set, status_text)
-            except Exception:
+                self._wake_send.send(b"\x00")
+            except OSError:
                 pass
 
-            if plugged is not None and (last_plugged is None or plugged != last_plugged):
-                # state changed -> decide and apply (respect override)
-                if not self.override_var.get():
-                    # Use dynamic rate selection based on available rates
-                    if plugged:
-                        # Use highest
-                        target = max(self.available_rates)
-                    else:
-                        # Use lowest
-                        target = min(self.available_rates)
-                    
-                    try:
-                        set_refresh_rate(target)
-                        self.root.after(0, self.current_rate_var.set, f"{target} Hz")
-                    except Exception as e:
-                        # show error once in UI thread
-                        try:
-                            self.root.after(0, messagebox.showwarning, "Could not change refresh rate", str(e))
-                        except Exception:
-                            pass
-            last_plugged = plugged
-            # poll interval
-            for _ in range(int(self.POLL_INTERVAL_SECONDS*2)):
-                if not self.running:
-                    break
-                time.sleep(0.5)
+    def _drain_pending(self):
+        with self._ui_lock:
+            pending = self._ui_pending
+            self._ui_pending = {}
+        if 'ac_changed' in pending:
+            self._on_ac_changed(pending['ac_changed'])
+
+    def _on_power_event(self, fd=None, mask=None):
+        # Tk file handler: drain the wakeup bytes, then the queued work.
+        try:
+            while self._wake_recv.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        self._drain_pending()
+
+    def _tick(self):
+        # Coalesced UI tick on the Tk thread. With the file handler active the
+        # tick only refreshes the rate label (5s); otherwise it also drains
+        # worker-thread updates at 4 Hz, with the label folded in every 20th.
+        if self._filehandler:
+            self.update_current_refresh_label()
+        else:
+            self._drain_pending()
+            self._tick_count += 1
+            if self._tick_count % 20 == 0:
+                self.update_current_refresh_label()
+        if self.running:
+            self.root.after(self._tick_ms, self._tick)
+
+    def _on_ac_changed(self, plugged):
+        # Runs on the Tk thread: update status text and apply the new rate.
+        self.current_status_var.set(_AC_TEXT[plugged])
+        if plugged is None or self.override_var.get():
+            return
+        target = self._targets[plugged]
+        try:
+            set_refresh_rate(target)
+            self._refresh_snapshot(plugged)
+            self.current_rate_var.set(f"{target} Hz")
+            self._last_error_sig = None
+            self.error_var.set("")
+        except Exception as e:
+            # report each distinct failure once, not on every transition
+            sig = (type(e).__name__, str(e), target)
+            if sig != self._last_error_sig:
+                self._last_error_sig = sig
+                self.error_var.set(f"Could not change refresh rate: {e}")
+
+    def power_event_loop(self):
+        # Register for AC/DC notifications and sleep until one arrives; no
+        # periodic GetSystemPowerStatus polling unless the status is unknown.
+        self._create_power_window()
+        # seed state with the current status before any notification fires
+        self._handle_power_change(self._query_plugged())
+        msg = wintypes.MSG()
+        handles = (wintypes.HANDLE * 1)(self._stop_event)
+        while self.running:
+            res = MsgWaitForMultipleObjectsEx(1, handles, int(self.FALLBACK_POLL_SECONDS * 1000),
+                                              QS_ALLINPUT, 0)
+            if res == WAIT_OBJECT_0:
+                break  # stop event signalled by on_exit/_tray_exit
+            while PeekMessageW(ctypes.byref(msg), None, 0, 0, PM_REMOVE):
+                TranslateMessage(ctypes.byref(msg))
+                DispatchMessageW(ctypes.byref(msg))
+            # refresh the cached mode snapshot at most once per wakeup; this
+            # doubles as the fallback power poll while the status is unknown
+            plugged = self._refresh_snapshot(self._last_plugged)
+            self._handle_power_change(plugged)
 
 def main():
     if os.name != 'nt':